@@ -2,6 +2,7 @@
 import os
 import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 from setuptools import setup
 from setuptools.command.build_py import build_py
@@ -10,27 +11,148 @@ from setuptools.command.develop import develop
 long_description = "This package makes the [patty](https://github.com/matteocarde/patty/tree/main) planner available in the [unified_planning library](https://github.com/aiplan4eu/unified-planning) by the [AIPlan4EU project](https://www.aiplan4eu-project.eu/)."
 
 PATTY_REPO = "https://github.com/matteocarde/patty.git"
+PATTY_CACHE = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser(os.path.join("~", ".cache"))), "up_patty")
+PATTY_MIRROR = os.path.join(PATTY_CACHE, "patty.git")
+
+def _git_version():
+    """Return the installed git version as a tuple of ints, or () if unknown."""
+    try:
+        out = subprocess.run(["git", "--version"], capture_output=True, text=True).stdout
+    except OSError:
+        return ()
+    # e.g. "git version 2.39.3 (Apple Git-145)" or "git version 2.45.1.windows.1"
+    number = next((word for word in out.split() if word[:1].isdigit()), "")
+    version = []
+    for part in number.split("."):
+        if not part.isdigit():
+            break
+        version.append(int(part))
+    return tuple(version)
+
+def _filter_args():
+    """The blobless filter is only understood by git >= 2.19."""
+    return ["--filter=blob:none"] if _git_version() >= (2, 19) else []
+
+def _clone_command():
+    """Build a shallow clone command, using a blobless filter when git supports it."""
+    return ["git", "clone", "--depth=1", "--single-branch"] + _filter_args() + [PATTY_REPO, "patty"]
+
+def _remote_head():
+    """Return the SHA of the remote HEAD, or None if the remote is unreachable."""
+    try:
+        out = subprocess.run(["git", "ls-remote", PATTY_REPO, "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    if out.returncode != 0 or not out.stdout.split():
+        return None
+    return out.stdout.split()[0]
+
+def _checkout_head():
+    """Return the SHA checked out in ./patty, or None if there is no usable checkout."""
+    # Without its own .git, git -C would report the HEAD of an enclosing repository.
+    if not os.path.exists(os.path.join("patty", ".git")):
+        return None
+    try:
+        out = subprocess.run(["git", "-C", "patty", "rev-parse", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    if out.returncode != 0 or not out.stdout.strip():
+        return None
+    return out.stdout.strip()
+
+def _clone_from_cache():
+    """Clone patty through the local mirror in PATTY_CACHE, creating or refreshing it first.
+
+    The mirror keeps all blobs: --dissociate has to copy the borrowed objects
+    into the new clone, which fails against a partial (blobless) mirror.
+    Downloading it costs more than a shallow clone, so it is only created when
+    an existing checkout is refreshed, not on a first install.
+    """
+    if os.path.isdir(PATTY_MIRROR):
+        ok = subprocess.run(["git", "-C", PATTY_MIRROR, "fetch", "--prune"]).returncode == 0
+    else:
+        os.makedirs(PATTY_CACHE, exist_ok=True)
+        ok = subprocess.run(["git", "clone", "--mirror", PATTY_REPO, PATTY_MIRROR]).returncode == 0
+    if ok:
+        ok = subprocess.run(["git", "clone", "--reference", PATTY_MIRROR, "--dissociate", "--depth=1", PATTY_REPO, "patty"]).returncode == 0
+    if not ok:
+        # Fall back to a plain clone if the mirror is unusable.
+        if os.path.exists("patty"):
+            shutil.rmtree("patty")
+        ok = subprocess.run(_clone_command()).returncode == 0
+    return ok
+
+def _link_or_copy(src, dst):
+    """Hardlink src to dst, copying instead when linking is not possible.
+
+    The staged files are build inputs only, so the copy skips copystat's
+    extra metadata syscalls (copyfile uses sendfile where available).
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def _copy_tree(src, dst):
+    """Stage the tree at src into dst, linking or copying files concurrently."""
+    jobs = []
+
+    def collect(directory, target_dir):
+        os.makedirs(target_dir, exist_ok=True)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                target = os.path.join(target_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    collect(entry.path, target)
+                elif entry.is_file():
+                    jobs.append((entry.path, target))
+
+    collect(src, dst)
+
+    cpus = os.cpu_count() or 1
+    if cpus == 1:
+        for job in jobs:
+            _link_or_copy(*job)
+        return
+    with ThreadPoolExecutor(max_workers=min(32, cpus * 4)) as executor:
+        futures = [executor.submit(_link_or_copy, *job) for job in jobs]
+        for future in futures:
+            future.result()
+
 def clone_and_compile_patty():
     
     curr_dir = os.path.abspath(os.path.dirname(__file__))
-    print("Cloning patty repository...")
-    for _dir in ["patty"]:
-        if os.path.exists(_dir):
-            shutil.rmtree(_dir)
-            print(f"Folder '{_dir}' deleted.")
-    subprocess.run(["git", "clone", PATTY_REPO])
+    head = _remote_head()
+    checkout = _checkout_head()
+    if checkout is not None and (head is None or head == checkout):
+        print("Patty repository is up to date, skipping clone.")
+    else:
+        print("Cloning patty repository...")
+        refresh = os.path.isdir(PATTY_MIRROR) or checkout is not None
+        for _dir in ["patty"]:
+            if os.path.exists(_dir):
+                shutil.rmtree(_dir)
+                print(f"Folder '{_dir}' deleted.")
+        if refresh:
+            _clone_from_cache()
+        else:
+            subprocess.run(_clone_command())
 
     patty_dir = os.path.join(curr_dir, "up_patty", "patty")
     os.makedirs(patty_dir, exist_ok=True)
-    init_file = os.path.join(patty_dir, "__init__.py")
-    if not os.path.exists(init_file):
-        with open(init_file, "w") as f:
-            f.write("\n")
-    
-    shutil.copytree(os.path.join(curr_dir, "patty", "src"), os.path.join(patty_dir, "src"), False, None, dirs_exist_ok=True)
-    shutil.copy2(os.path.join(curr_dir, "patty", "main.py"), patty_dir)
-    shutil.copy2(os.path.join(curr_dir, "patty", "README.md"), patty_dir)
-    shutil.copy2(os.path.join(curr_dir, "patty", "LICENSE"), patty_dir)
+    try:
+        fd = os.open(os.path.join(patty_dir, "__init__.py"), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        pass
+    else:
+        os.write(fd, b"\n")
+        os.close(fd)
+
+    _copy_tree(os.path.join(curr_dir, "patty", "src"), os.path.join(patty_dir, "src"))
+    for name in ("main.py", "README.md", "LICENSE"):
+        _link_or_copy(os.path.join(curr_dir, "patty", name), os.path.join(patty_dir, name))
 
 
 class install_patty(build_py):
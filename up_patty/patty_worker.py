@@ -0,0 +1,38 @@
+"""
+Long-running patty process used by PattyPlanner when `persistent` is set.
+
+Started as `python -u patty_worker.py <path to patty main.py>`, it reads one
+request per line from stdin: the patty command line arguments joined by NUL
+characters. Each request is run through patty's main.py in this interpreter,
+so the interpreter startup and patty's imports are only paid once, and is
+answered on stdout with `OK <exit code>` or `ERR <message>`.
+Everything patty prints is sent to stderr.
+"""
+import os
+import runpy
+import sys
+
+
+def serve(executable):
+    replies = os.fdopen(os.dup(1), "w", buffering=1)
+    # Keep patty's own output (including the solvers') away from the replies.
+    os.dup2(2, 1)
+    sys.path.insert(0, os.path.dirname(executable))
+
+    for line in sys.stdin:
+        sys.argv = [executable] + line.rstrip("\n").split("\0")
+        try:
+            runpy.run_path(executable, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            replies.write(f"ERR {type(e).__name__}: {e}".replace("\n", " ") + "\n")
+            continue
+        finally:
+            sys.stdout.flush()
+        replies.write(f"OK {code}\n")
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -1,26 +1,34 @@
-import sys
-
-from itertools import chain
-from typing import Callable, IO, Optional
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, IO, Mapping, Optional, Tuple
 
 import unified_planning as up
-from unified_planning.engines.results import LogMessage
 from unified_planning.shortcuts import PlanValidator
 from unified_planning.engines.results import PlanGenerationResult, LogMessage, LogLevel
 from unified_planning.engines.mixins import OneshotPlannerMixin
 from unified_planning.engines import PlanGenerationResultStatus, Engine, ValidationResultStatus
 from unified_planning.model import ProblemKind, Problem
-from unified_planning.plans import SequentialPlan
-from unified_planning.io import PDDLWriter, PDDLReader
+from unified_planning.plans import ActionInstance, PlanKind, SequentialPlan
+from unified_planning.io import PDDLWriter
+from unified_planning.exceptions import UPException
 
+import codecs
+import contextlib
+import io
+import re
+import runpy
+import select
+import selectors
 import subprocess
 import tempfile
+import threading
+import time
 import os
 import sys
-import threading
-import tempfile
+import weakref
 
-credits = {
+credits = MappingProxyType({
     "name": "Patty",
     "author": "Matteo Cardellini",
     # "contact": "david.speck@liu.se (for UP integration)",
@@ -28,32 +36,369 @@ credits = {
     "license": "MIT",
     "short_description": "A Numeric Planner made with SMT.",
     "long_description": "A Numeric Planner made with SMT.",
-}
+})
+
+# Shared default for engines constructed without planner arguments.
+_EMPTY: Mapping[str, str] = MappingProxyType({})
+
+# select() only accepts sockets on Windows, where the planner's pipes are read from threads
+# and the persistent worker is not available.
+_SELECTABLE_PIPES = os.name != 'nt'
+
+# Planner output is forwarded in batches of up to this many bytes, or after this many seconds.
+_OUTPUT_BATCH_SIZE = 16 * 1024
+_OUTPUT_BATCH_DELAY = 0.05
+
+# One "N: (action arg1 arg2 ...)" step of a plan written by patty.
+_PLAN_STEP = re.compile(r'\s*(?:\d+:\s*)?\(\s*([^\s()]+)((?:\s+[^\s()]+)*)\s*\)\s*')
+
+# PDDL written for live problems when the cache_pddl option is set, keyed on id(problem).
+# An entry holds only a weak reference to its problem and is dropped when the problem
+# is garbage collected.
+_PDDL_CACHE: Dict[int, Tuple[weakref.ref, str, Dict[str, Any], bytes, bytes]] = {}
+
+def _pddl_for(problem: Problem) -> Tuple[Dict[str, Any], bytes, bytes]:
+    """Return the PDDL-name-to-item mapping and the domain and problem PDDL of problem.
+
+    An entry is reused only while repr(problem) is unchanged, so a problem
+    changed in place after it was solved gets its PDDL written again.
+    """
+    key = id(problem)
+    entry = _PDDL_CACHE.get(key)
+    if entry is not None and entry[0]() is problem and entry[1] == repr(problem):
+        return entry[2:]
+
+    def evict(ref, key=key):
+        # The id may already belong to a newer problem with its own entry.
+        if _PDDL_CACHE.get(key, (None,))[0] is ref:
+            del _PDDL_CACHE[key]
+
+    writer = PDDLWriter(problem)
+    domain, problem_pddl = writer.get_domain().encode(), writer.get_problem().encode()
+    # Taken after writing, which fills in the problem's default initial values.
+    text = repr(problem)
+    # Only the renamings are kept: the writer references the problem and would keep it alive.
+    entry = (weakref.ref(problem, evict), text, dict(writer.nto_renamings), domain, problem_pddl)
+    _PDDL_CACHE[key] = entry
+    return entry[2:]
+
+def _write_pddl(problem: Problem) -> Tuple[Dict[str, Any], bytes, bytes]:
+    """Return what _pddl_for does, without caching it."""
+    writer = PDDLWriter(problem)
+    return writer.nto_renamings, writer.get_domain().encode(), writer.get_problem().encode()
+
+def _build_supported_kind() -> ProblemKind:
+    supported_kind = ProblemKind()
+    supported_kind.set_problem_class("ACTION_BASED")
+    supported_kind.set_problem_type("GENERAL_NUMERIC_PLANNING")
+    supported_kind.set_typing('FLAT_TYPING')
+    supported_kind.set_typing('HIERARCHICAL_TYPING')
+    supported_kind.set_numbers('CONTINUOUS_NUMBERS')
+    supported_kind.set_numbers('DISCRETE_NUMBERS')
+    supported_kind.set_fluents_type('NUMERIC_FLUENTS')
+    supported_kind.set_numbers('BOUNDED_TYPES')
+    supported_kind.set_fluents_type('OBJECT_FLUENTS')
+    supported_kind.set_conditions_kind('NEGATIVE_CONDITIONS')
+    supported_kind.set_conditions_kind('DISJUNCTIVE_CONDITIONS')
+    supported_kind.set_conditions_kind('EQUALITIES')
+    supported_kind.set_conditions_kind('EXISTENTIAL_CONDITIONS')
+    supported_kind.set_conditions_kind('UNIVERSAL_CONDITIONS')
+    supported_kind.set_effects_kind('CONDITIONAL_EFFECTS')
+    supported_kind.set_effects_kind('INCREASE_EFFECTS')
+    supported_kind.set_effects_kind('DECREASE_EFFECTS')
+    supported_kind.set_effects_kind('FLUENTS_IN_NUMERIC_ASSIGNMENTS')
+    return supported_kind
+
+_SUPPORTED_KIND = _build_supported_kind()
+
+@lru_cache(maxsize=64)
+def _supports_features(features: frozenset, version: int) -> bool:
+    return ProblemKind(features, version) <= _SUPPORTED_KIND
+
+class _OutputForwarder:
+    """
+    Forwards planner output to a text stream in batches of up to _OUTPUT_BATCH_SIZE
+    bytes, at most _OUTPUT_BATCH_DELAY seconds after it was read.
+
+    Without a stream the output is dropped, except for its last _OUTPUT_BATCH_SIZE
+    bytes which are written to stderr if the planner fails.
+    """
+
+    def __init__(self, output_stream: Optional[IO[str]]):
+        self.quiet = output_stream is None
+        self.stream = sys.stderr if output_stream is None else output_stream
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.pending = bytearray()
+        self.flush_at: Optional[float] = None
+
+    def feed(self, data: bytes):
+        self.pending.extend(data)
+        if self.quiet:
+            del self.pending[:-_OUTPUT_BATCH_SIZE]
+        elif len(self.pending) >= _OUTPUT_BATCH_SIZE:
+            self.flush()
+        elif self.flush_at is None:
+            self.flush_at = time.monotonic() + _OUTPUT_BATCH_DELAY
+
+    def drain(self, fd: int):
+        """Feed everything that can be read from the non-blocking fd right now."""
+        try:
+            while True:
+                data = os.read(fd, 65536)
+                if not data:
+                    return
+                self.feed(data)
+        except BlockingIOError:
+            pass
+
+    def flush(self):
+        """Write the pending output, as raw bytes when the stream has a buffer."""
+        self.flush_at = None
+        if not self.pending:
+            return
+        buffer = getattr(self.stream, 'buffer', None)
+        if buffer is not None:
+            self.stream.flush()
+            buffer.write(self.pending)
+            buffer.flush()
+        else:
+            self.stream.write(self.decoder.decode(self.pending))
+            self.stream.flush()
+        self.pending.clear()
+
+    def finish(self, return_code: Optional[int]):
+        """Write what is left, which a quiet forwarder only does if the planner failed."""
+        if not self.quiet or return_code != 0:
+            self.flush()
+
+# patty's own modules, imported by in-process solves and kept out of sys.modules between them.
+_PATTY_MODULES: Dict[str, Any] = {}
+
+@lru_cache(maxsize=None)
+def _top_level_names(folder: str) -> frozenset:
+    """Return the names of the modules and packages that can be imported from folder."""
+    names = set()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            name, ext = (entry.name, '') if entry.is_dir() else os.path.splitext(entry.name)
+            if name.isidentifier() and not name.startswith('__') and (ext == '.py' or not ext):
+                names.add(name)
+    return frozenset(names)
+
+def _report(output_stream: Optional[IO[str]], message: str):
+    """Write an engine message to output_stream; without one it is dropped."""
+    if output_stream is not None:
+        output_stream.write(message + "\n")
 
 class PattyPlanner(Engine, OneshotPlannerMixin):
     def __init__(self, **options):
         Engine.__init__(self)
         OneshotPlannerMixin.__init__(self)
-        self._args = options.get('args', {})  # None if not specified
+        self._args = dict(options.get('args', _EMPTY))
+        # patty is always given a plan file; a user supplied one replaces the temporary file.
+        self._plan_file = self._args.pop('--save-plan', None)
+        self._in_process = options.get('in_process', False)
+        self._persistent = options.get('persistent', False)
+        self._validate = options.get('validate', True)
+        self._pddl_for = _pddl_for if options.get('cache_pddl', False) else _write_pddl
+        self._validator_cache: Dict[Tuple[frozenset, PlanKind], Engine] = {}
+        self._worker: Optional[subprocess.Popen] = None
         self.executable = os.path.join(os.path.dirname(__file__), "patty", "main.py")
+        # Only the PDDL files and the plan file change between solves.
+        self._argv_prefix = (sys.executable, self.executable, '-o')
+        self._argv_suffix = tuple(x for kv in self._args.items() for x in kv)
     
-    def _stream_output(self, pipe, prefix=""):
-        """Stream output from subprocess pipe directly to stdout in real-time."""
-        if not pipe:
-            return
+    def _run_in_process(self, argv, output_stream: Optional[IO[str]]) -> int:
+        """Run patty's main.py in this interpreter and return its exit code.
+
+        Patty's own modules (e.g. `src`) are moved out of sys.modules after each
+        run and put back for the next one, so only the first call pays for their
+        imports. Host modules with the same top-level names are set aside while
+        patty runs.
+
+        What patty prints goes to output_stream; without one its stdout is
+        dropped and the tail of its stderr is written to sys.stderr only if it
+        fails, as for a subprocess.
+
+        sys.argv, sys.path, sys.modules and the stdout/stderr redirection are
+        process-global, so in-process solves must not run concurrently.
+        """
+        saved_argv = sys.argv
+        sys.argv = list(argv)
+        # patty's main.py imports its modules relative to its own folder.
+        patty_dir = os.path.dirname(self.executable)
+        sys.path.insert(0, patty_dir)
+        patty_names = _top_level_names(patty_dir)
+        hidden = {name: sys.modules.pop(name) for name in list(sys.modules) if name.partition('.')[0] in patty_names}
+        sys.modules.update(_PATTY_MODULES)
+        errors = io.StringIO() if output_stream is None else None
+        return_code = 1
         try:
-            for line in iter(pipe.readline, b''):
-                if not line:
-                    break
-                line_str = line.decode('utf-8', errors='replace').rstrip()
-                if line_str:
-                    print(f"{prefix}{line_str}")
-                    sys.stdout.flush()
-        except Exception:
-            pass  # Handle any decoding errors silently
+            with contextlib.ExitStack() as stack:
+                if output_stream is None:
+                    stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+                    stack.enter_context(contextlib.redirect_stderr(errors))
+                else:
+                    stack.enter_context(contextlib.redirect_stdout(output_stream))
+                    stack.enter_context(contextlib.redirect_stderr(output_stream))
+                try:
+                    runpy.run_path(self.executable, run_name="__main__")
+                    return_code = 0
+                except SystemExit as e:
+                    return_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
         finally:
-            if pipe:
-                pipe.close()
+            sys.argv = saved_argv
+            if patty_dir in sys.path:
+                sys.path.remove(patty_dir)
+            for name in [name for name in sys.modules if name.partition('.')[0] in patty_names]:
+                _PATTY_MODULES[name] = sys.modules.pop(name)
+            sys.modules.update(hidden)
+            if errors is not None and return_code != 0:
+                sys.stderr.write(errors.getvalue()[-_OUTPUT_BATCH_SIZE:])
+        return return_code
+
+    def _run_worker(self, argv, timeout: Optional[float], output_stream: Optional[IO[str]]) -> Optional[int]:
+        """Run the planner in the persistent worker and return its exit code, or None on timeout.
+
+        The worker is started on first use, and killed if it does not answer in
+        time or the exchange is interrupted before its reply. Requests are framed
+        with NUL and newline characters, so arguments containing them are rejected.
+        """
+        if any('\0' in arg or '\n' in arg for arg in argv):
+            raise ValueError("The persistent worker cannot pass arguments containing NUL or newline characters.")
+        if self._worker is None or self._worker.poll() is not None:
+            self._worker = subprocess.Popen(
+                [sys.executable, '-u', os.path.join(os.path.dirname(__file__), "patty_worker.py"), self.executable],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True
+            )
+            os.set_blocking(self._worker.stderr.fileno(), False)
+        worker = self._worker
+        try:
+            worker.stdin.write('\0'.join(argv) + '\n')
+            worker.stdin.flush()
+
+            # patty's output arrives on the worker's stderr, all of it before the reply.
+            deadline = None if timeout is None else time.monotonic() + timeout
+            output = _OutputForwarder(output_stream)
+            reply = None
+            while reply is None:
+                now = time.monotonic()
+                if output.flush_at is not None and now >= output.flush_at:
+                    output.flush()
+                wakeups = [t for t in (deadline, output.flush_at) if t is not None]
+                ready, _, _ = select.select([worker.stdout, worker.stderr], [], [], max(min(wakeups) - now, 0) if wakeups else None)
+                if worker.stderr in ready or worker.stdout in ready:
+                    output.drain(worker.stderr.fileno())
+                if worker.stdout in ready:
+                    reply = worker.stdout.readline().rstrip('\n')
+                elif deadline is not None and time.monotonic() >= deadline:
+                    output.finish(None)
+                    self._stop_worker()
+                    return None
+        except BaseException:
+            # A worker left with an unanswered request would hand its reply to the next solve.
+            self._stop_worker()
+            raise
+
+        if reply.startswith('OK '):
+            return_code = int(reply[3:])
+            output.finish(return_code)
+            return return_code
+        output.finish(None)
+        # The worker answered an ERR and can take the next request; an empty reply means it exited.
+        if reply.startswith('ERR '):
+            raise RuntimeError(reply[4:])
+        self._stop_worker()
+        raise RuntimeError("The patty worker exited unexpectedly.")
+
+    def _stop_worker(self):
+        if self._worker is not None:
+            self._worker.kill()
+            self._worker.wait()
+            self._worker = None
+
+    def _forward_selected(self, pipes, output: _OutputForwarder, deadline: Optional[float]) -> bool:
+        """Forward the pipes to output from a single selector loop until they close.
+
+        Returns True if the deadline passed first.
+        """
+        with selectors.DefaultSelector() as selector:
+            for pipe in pipes:
+                selector.register(pipe, selectors.EVENT_READ)
+            while selector.get_map():
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return True
+                if output.flush_at is not None and now >= output.flush_at:
+                    output.flush()
+                wakeups = [t for t in (deadline, output.flush_at) if t is not None]
+                for key, _ in selector.select(min(wakeups) - now if wakeups else None):
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        output.feed(data)
+                    else:
+                        selector.unregister(key.fileobj)
+        return False
+
+    def _forward_threaded(self, process, pipes, output: _OutputForwarder, deadline: Optional[float]) -> bool:
+        """Forward the pipes to output from one thread each, where pipes cannot be selected.
+
+        Without a loop to flush on time, every chunk read is written straight away.
+        Returns True if the process had to be killed at the deadline.
+        """
+        lock = threading.Lock()
+
+        def pump(pipe):
+            for data in iter(lambda: os.read(pipe.fileno(), 65536), b''):
+                with lock:
+                    output.feed(data)
+                    if not output.quiet:
+                        output.flush()
+
+        threads = [threading.Thread(target=pump, args=(pipe,), daemon=True) for pipe in pipes]
+        for thread in threads:
+            thread.start()
+        try:
+            process.wait(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            process.kill()
+            timed_out = True
+        for thread in threads:
+            thread.join(timeout=1.0)
+        return timed_out
+
+    def _run_subprocess(self, command, timeout: Optional[float], output_stream: Optional[IO[str]]) -> Optional[int]:
+        """Run the planner in a subprocess and return its exit code, or None on timeout.
+
+        The planner's stdout and stderr are forwarded to output_stream. Without one,
+        stdout is discarded and stderr is only reported if the planner fails.
+        """
+        stdout = subprocess.DEVNULL if output_stream is None else subprocess.PIPE
+        with subprocess.Popen(command, stdout=stdout, stderr=subprocess.PIPE) as process:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            output = _OutputForwarder(output_stream)
+            pipes = [pipe for pipe in (process.stdout, process.stderr) if pipe is not None]
+            if _SELECTABLE_PIPES:
+                timed_out = self._forward_selected(pipes, output, deadline)
+            else:
+                timed_out = self._forward_threaded(process, pipes, output, deadline)
+
+            # Both pipes are closed, the planner is exiting
+            return_code = None
+            if not timed_out:
+                try:
+                    return_code = process.wait(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+                except subprocess.TimeoutExpired:
+                    pass
+            if return_code is None:
+                process.kill()
+            output.finish(return_code)
+
+        return return_code
 
     @property
     def name(self) -> str:
@@ -61,61 +406,48 @@ class PattyPlanner(Engine, OneshotPlannerMixin):
 
     @staticmethod
     def supported_kind():
-        supported_kind = ProblemKind()
-        supported_kind.set_problem_class("ACTION_BASED")
-        supported_kind.set_problem_type("GENERAL_NUMERIC_PLANNING")
-        supported_kind.set_typing('FLAT_TYPING')
-        supported_kind.set_typing('HIERARCHICAL_TYPING')
-        supported_kind.set_numbers('CONTINUOUS_NUMBERS')
-        supported_kind.set_numbers('DISCRETE_NUMBERS')
-        supported_kind.set_fluents_type('NUMERIC_FLUENTS')
-        supported_kind.set_numbers('BOUNDED_TYPES')
-        supported_kind.set_fluents_type('OBJECT_FLUENTS')
-        supported_kind.set_conditions_kind('NEGATIVE_CONDITIONS')
-        supported_kind.set_conditions_kind('DISJUNCTIVE_CONDITIONS')
-        supported_kind.set_conditions_kind('EQUALITIES')
-        supported_kind.set_conditions_kind('EXISTENTIAL_CONDITIONS')
-        supported_kind.set_conditions_kind('UNIVERSAL_CONDITIONS')
-        supported_kind.set_effects_kind('CONDITIONAL_EFFECTS')
-        supported_kind.set_effects_kind('INCREASE_EFFECTS')
-        supported_kind.set_effects_kind('DECREASE_EFFECTS')
-        supported_kind.set_effects_kind('FLUENTS_IN_NUMERIC_ASSIGNMENTS')
-        return supported_kind
+        return _SUPPORTED_KIND
 
     @staticmethod
     def supports(problem_kind):
-        return problem_kind <= PattyPlanner.supported_kind()
+        return _supports_features(frozenset(problem_kind.features), problem_kind.version)
 
-    def _validate_plan(self, problem: Problem, plan: SequentialPlan) -> bool:
+    def _validate_plan(self, problem: Problem, plan: SequentialPlan, output_stream: Optional[IO[str]]) -> bool:
         """
         Validate a plan against the problem using Unified Planning's PlanValidator.
         
         Args:
             problem: The original problem (not grounded)
             plan: The plan to validate (should be mapped back to the original problem)
+            output_stream: Where the validation report is written, if anywhere
             
         Returns:
             bool: True if the plan is valid, False otherwise
         """
         try:
-            with PlanValidator(problem_kind=problem.kind, plan_kind=plan.kind) as validator:
-                validation_result = validator.validate(problem, plan)  # type: ignore[attr-defined]
-                
-                if validation_result.status == ValidationResultStatus.VALID:
-                    print("Plan validation: VALID")
-                    print(f"  The plan with {len(plan.actions)} actions is correct and executable.")
-                    return True
+            problem_kind = problem.kind
+            key = (frozenset(problem_kind.features), plan.kind)
+            validator = self._validator_cache.get(key)
+            if validator is None:
+                validator = PlanValidator(problem_kind=problem_kind, plan_kind=plan.kind)
+                self._validator_cache[key] = validator
+            validation_result = validator.validate(problem, plan)  # type: ignore[attr-defined]
+
+            if validation_result.status == ValidationResultStatus.VALID:
+                _report(output_stream, "Plan validation: VALID")
+                _report(output_stream, f"  The plan with {len(plan.actions)} actions is correct and executable.")
+                return True
+            else:
+                _report(output_stream, f"Plan validation: {validation_result.status.name}")
+                if validation_result.log_messages:
+                    for log_msg in validation_result.log_messages:
+                        _report(output_stream, f"  Validation {log_msg.level.name}: {log_msg.message}")
                 else:
-                    print(f"Plan validation: {validation_result.status.name}")
-                    if validation_result.log_messages:
-                        for log_msg in validation_result.log_messages:
-                            print(f"  Validation {log_msg.level.name}: {log_msg.message}")
-                    else:
-                        print("  No detailed validation messages available.")
-                    return False
-                    
+                    _report(output_stream, "  No detailed validation messages available.")
+                return False
+
         except Exception as e:
-            print(f"Plan validation failed with error: {e}")
+            _report(output_stream, f"Plan validation failed with error: {e}")
             return False
 
     def _solve(self, problem: Problem,
@@ -126,61 +458,37 @@ class PattyPlanner(Engine, OneshotPlannerMixin):
         try:
             final_plan = None
             with tempfile.TemporaryDirectory() as tmpdirname:
-                task_writer = PDDLWriter(problem)
+                renamings, domain_pddl, problem_pddl = self._pddl_for(problem)
                 domainfile  = os.path.join(tmpdirname, "domain.pddl")
                 problemfile = os.path.join(tmpdirname, "problem.pddl")
 
-                task_writer.write_domain(domainfile)
-                task_writer.write_problem(problemfile)
+                Path(domainfile).write_bytes(domain_pddl)
+                Path(problemfile).write_bytes(problem_pddl)
 
-                plan_dump_file = self._args.get('--save-plan', os.path.join(tmpdirname, "plan.dump"))
-                if '--save-plan' in self._args: self._args.pop('--save-plan')
-                
-                # consturct the basic command.
-                command = ['python', self.executable, '-o', domainfile, '-f', problemfile, '--save-plan', plan_dump_file]
-                # append planner arguments.
-                command += list(chain.from_iterable([[k,v] for k,v in self._args.items()]))
+                plan_dump_file = self._plan_file or os.path.join(tmpdirname, "plan.dump")
+                command = self._argv_prefix + (domainfile, '-f', problemfile, '--save-plan', plan_dump_file) + self._argv_suffix
                 
-                # Run the C++ planner with real-time output streaming
-                process = subprocess.Popen(
-                    command, 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE,
-                    universal_newlines=False  # Use bytes mode for threading
-                )
-
-                # Create threads to stream stdout and stderr in real-time
-                stdout_thread = threading.Thread(target=self._stream_output, args=(process.stdout, ""))
-                stderr_thread = threading.Thread(target=self._stream_output, args=(process.stderr, "ERROR: "))
-                
-                stdout_thread.daemon = True
-                stderr_thread.daemon = True
-                
-                stdout_thread.start()
-                stderr_thread.start()
-
-                # Wait for process to complete with timeout
-                try:
-                    return_code = process.wait(timeout=timeout)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    print("Planner timed out.")
+                # A run inside this interpreter cannot be interrupted, so timed solves use a subprocess.
+                if self._in_process and timeout is None:
+                    return_code = self._run_in_process(command[1:], output_stream)
+                elif self._persistent and _SELECTABLE_PIPES:
+                    return_code = self._run_worker(command[2:], timeout, output_stream)
+                else:
+                    return_code = self._run_subprocess(command, timeout, output_stream)
+                if return_code is None:
+                    _report(output_stream, "Planner timed out.")
                     return PlanGenerationResult(
                         PlanGenerationResultStatus.TIMEOUT, None, self.name,
                         log_messages=[LogMessage(level=LogLevel.INFO, message="Planner timed out.")]
                     )
 
-                # Wait for output threads to finish
-                stdout_thread.join(timeout=1.0)
-                stderr_thread.join(timeout=1.0)
-
                 # Handle process errors
                 if return_code != 0:
                     error_msg = f"The planner failed with return code {return_code}."
                     if return_code == -11:  # Specific check for SIGSEGV
                         error_msg += " - The error might be a segmentation fault (SIGSEGV)."
                     
-                    print(f"ERROR: {error_msg}")
+                    _report(output_stream, f"ERROR: {error_msg}")
                     return PlanGenerationResult(
                         PlanGenerationResultStatus.INTERNAL_ERROR, None, self.name,
                         log_messages=[LogMessage(level=LogLevel.ERROR, message=error_msg)]
@@ -188,10 +496,25 @@ class PattyPlanner(Engine, OneshotPlannerMixin):
 
                 # Read and convert solution
                 with open(plan_dump_file, 'r') as f:
-                    actions = f.readlines()
-                
-                final_plan = PDDLReader().parse_plan_string(problem, '\n'.join(map(lambda a:a.strip().split(': ')[1], actions)))
-                plan_is_valid = self._validate_plan(problem, final_plan)
+                    plan_text = f.read().lower()
+
+                # Map the PDDL names back to the problem's actions and objects.
+                def get_item_named(name):
+                    item = renamings.get(name)
+                    if item is None:
+                        raise UPException(f"The name {name} does not correspond to any item.")
+                    return item
+
+                plan_actions = []
+                for line in plan_text.splitlines():
+                    if not line.strip():
+                        continue
+                    step = _PLAN_STEP.fullmatch(line)
+                    if step is None:
+                        raise UPException(f"Error parsing the plan generated by patty. Cannot interpret {line}")
+                    plan_actions.append(ActionInstance(get_item_named(step.group(1)), tuple(map(get_item_named, step.group(2).split()))))
+                final_plan = SequentialPlan(plan_actions)
+                plan_is_valid = not self._validate or self._validate_plan(problem, final_plan, output_stream)
                 result_log_messages = []
                 ret_status = PlanGenerationResultStatus.SOLVED_SATISFICING
                 if not plan_is_valid:
@@ -213,7 +536,7 @@ class PattyPlanner(Engine, OneshotPlannerMixin):
             )
 
         except Exception as e:
-            print(f"An error occurred: {e}")
+            _report(output_stream, f"An error occurred: {e}")
             return PlanGenerationResult(
                 PlanGenerationResultStatus.INTERNAL_ERROR, None, self.name,
                 log_messages=[LogMessage(level=LogLevel.ERROR, message=str(e))]
@@ -222,4 +545,7 @@ class PattyPlanner(Engine, OneshotPlannerMixin):
             pass
 
     def destroy(self):
-        pass
\ No newline at end of file
+        self._stop_worker()
+        for validator in self._validator_cache.values():
+            validator.destroy()
+        self._validator_cache.clear()
\ No newline at end of file